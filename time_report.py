@@ -6,7 +6,6 @@ easy copying into a client's time reporting system.
 
 TODO:
 - combine API requests into a streamlined function?
-- handle failed requests (check http return code, timeout, etc.)
 - enable strict pylinting
 
 """
@@ -14,15 +13,96 @@ TODO:
 # pylint: disable=locally-disabled, redefined-outer-name, line-too-long, missing-function-docstring, invalid-name
 
 
-import json
-import configparser
+import hashlib
 import os
 import sys
+import time
 from argparse import ArgumentParser
 from base64 import b64encode
+from collections import defaultdict
 from datetime import date, timedelta, datetime
+from typing import Iterable, Optional
+
+import orjson
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "toggl-reports")
+# "use" reads and writes the response cache, "refresh" ignores cached responses
+# but stores new ones, "off" bypasses the cache entirely.
+cache_mode = "use"
+# (connect, read) timeouts in seconds for Toggl API requests
+REQUEST_TIMEOUT = (5, 30)
+# Day and month names for the report, as strftime() gives them in the C locale
+_WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+_MONTHS = (
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+)
+
+
+class TogglSession:  # pylint: disable=too-few-public-methods
+    """
+    HTTP session for the Toggl API, so that all queries in a run share
+    authentication headers and pooled keep-alive connections.
+
+    The underlying requests.Session is only set up when the first request has
+    to go over the network, so runs answered from the response cache never
+    import requests at all.
+    """
 
-import requests
+    def __init__(self, api_token: str):
+        auth = b64encode(f"{api_token}:api_token".encode("utf-8")).decode("ascii")
+        self.headers = {
+            "content-type": "application/json",
+            "Authorization": f"Basic {auth}",
+        }
+        self._session = None
+
+    def request(self, method: str, url: str, **kwargs):
+        if self._session is None:
+            self._session = self._create_session()
+        return self._session.request(method, url, **kwargs)
+
+    def _create_session(self):
+        # pylint: disable=import-outside-toplevel
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        session.headers.update(self.headers)
+        # Ride out rate limiting and transient server errors. The time entry
+        # search is a POST but doesn't modify anything, so it is safe to retry
+        # as well.
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=True,
+        )
+        session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry),
+        )
+        return session
 
 
 def get_previous_date_range(
@@ -42,43 +122,195 @@ def get_previous_date_range(
     assert num_days >= 1
     assert isinstance(end_date, date)
     start_day = end_date - timedelta(days=num_days)
-    return (start_day.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    return (start_day.isoformat(), end_date.isoformat())
+
+
+def _fetch(
+    session: TogglSession,
+    method: str,
+    url: str,
+    query: Optional[dict],
+):
+    """
+    Send a request to the Toggl API, raising on failed requests.
+
+    args:
+    session -- Toggl API session (a TogglSession)
+    method -- HTTP method, e.g. "GET"
+    url -- Toggl API endpoint
+    query -- JSON body to send, if any
+
+    returns:
+    tuple of (decoded JSON response, next row number for paginated results or None)
+    """
+    # pylint can't inspect the orjson C extension
+    # pylint: disable=no-member
+    data = session.request(
+        method,
+        url,
+        data=None if query is None else orjson.dumps(query),
+        timeout=REQUEST_TIMEOUT,
+    )
+    data.raise_for_status()
+    return orjson.loads(data.content), data.headers.get("X-Next-Row-Number")
 
 
-def query_toggl_workspaces(api_token: str):
+def _cache_path(
+    session: TogglSession,
+    method: str,
+    url: str,
+    ttl: Optional[float],
+    query: Optional[dict],
+):
+    """
+    Get the path a Toggl API response is cached under.
+
+    Each response is a file named after a hash of the request and its TTL, and
+    its mtime is when it was fetched, so freshness can be checked without
+    reading it.
+
+    args:
+    session -- Toggl API session (a TogglSession)
+    method -- HTTP method, e.g. "GET"
+    url -- Toggl API endpoint
+    ttl -- seconds a cached response stays valid, None to keep it forever
+    query -- JSON body to send, if any
+    """
+    # pylint can't inspect the orjson C extension
+    # pylint: disable=no-member
+    key = hashlib.sha256(
+        (method + url + session.headers["Authorization"]).encode("utf-8")
+        + orjson.dumps(query, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+    if ttl is None:
+        return os.path.join(CACHE_DIR, f"{key}.json")
+    return os.path.join(CACHE_DIR, f"{key}.{ttl:g}.json")
+
+
+def _read_cached_response(path: str, ttl: Optional[float]):
+    """
+    Read a response from the cache.
+
+    args:
+    path -- cache file (from _cache_path())
+    ttl -- seconds a cached response stays valid, None to keep it forever
+
+    returns:
+    the decoded JSON response, or None if there is no fresh cached copy
+    """
+    if cache_mode != "use":
+        return None
+    try:
+        if ttl is not None and time.time() - os.path.getmtime(path) >= ttl:
+            return None
+        with open(path, "rb") as cachefile:
+            return orjson.loads(cachefile.read())  # pylint: disable=no-member
+    except FileNotFoundError:
+        return None
+
+
+def _write_cached_response(path: str, body):
+    """
+    Store a response in the cache, and clear out expired ones.
+
+    args:
+    path -- cache file (from _cache_path())
+    body -- the decoded JSON response
+    """
+    if cache_mode == "off":
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temporary file and rename it into place, so a concurrent run
+    # never reads a partially written response
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as cachefile:
+        cachefile.write(orjson.dumps(body))  # pylint: disable=no-member
+    os.replace(tmp_path, path)
+    _remove_expired_responses()
+
+
+def _toggl_request(
+    session: TogglSession,
+    method: str,
+    url: str,
+    ttl: Optional[float],
+    query: Optional[dict] = None,
+):
+    """
+    Send a request to the Toggl API, serving it from the on-disk response cache
+    when a fresh enough copy exists.
+
+    args:
+    session -- Toggl API session (a TogglSession)
+    method -- HTTP method, e.g. "GET"
+    url -- Toggl API endpoint
+    ttl -- seconds a cached response stays valid, None to keep it forever
+    query -- JSON body to send, if any
+
+    returns:
+    the decoded JSON response
+    """
+    path = _cache_path(session, method, url, ttl, query)
+    body = _read_cached_response(path, ttl)
+    if body is None:
+        body, _ = _fetch(session, method, url, query)
+        _write_cached_response(path, body)
+    return body
+
+
+def _remove_expired_responses():
+    """
+    Deletes cached responses whose TTL has run out, e.g. today's time entries
+    from previous runs, whose date ranges won't be queried again.
+    """
+    now = time.time()
+    with os.scandir(CACHE_DIR) as cachefiles:
+        for cachefile in cachefiles:
+            if not cachefile.name.endswith(".json"):
+                continue
+            _, _, ttl = cachefile.name[: -len(".json")].partition(".")
+            if not ttl:
+                continue  # kept forever
+            try:
+                if now - cachefile.stat().st_mtime >= float(ttl):
+                    os.remove(cachefile.path)
+            except FileNotFoundError:
+                pass  # already removed by another run
+
+
+def query_toggl_workspaces(session: TogglSession):
     """
     Get the default workspace ID from Toggl (needed for other API calls).
 
     args:
-    api_token -- your API token
+    session -- Toggl API session (a TogglSession)
 
     returns:
     default workspace ID reported from Toggl
     """
-    data = requests.get(
-        "https://api.track.toggl.com/api/v9/me",
-        headers={
-            "content-type": "application/json",
-            "Authorization": f'Basic {b64encode(bytes(api_token + ":api_token", encoding="utf-8")).decode("ascii"):s}',
-        },
-    )
-    return data.json()["default_workspace_id"]
+    # The default workspace of an account doesn't change, cache it forever
+    data = _toggl_request(session, "GET", "https://api.track.toggl.com/api/v9/me", None)
+    return data["default_workspace_id"]
 
 
 def query_toggl_time_entries(
-    api_token: str,
+    session: TogglSession,
     workspace_id: int,
     client_ids: list,
     date_range: tuple,
 ):
     """
-    Run a query against the Toggl time entry search API.
+    Run a query against the Toggl time entry search API. Results are fetched
+    a page at a time as they are consumed.
 
     args:
-    api_token -- toggl API token
+    session -- toggl API session (a TogglSession)
     workspace_id -- toggl workspace ID to query
     client_ids -- list of client IDs to filter on, empty [] to include all clients
     date_range -- tuple of dates to filter: (start_date, end_date)
+
+    yields:
+    time entry search results
     """
     assert len(date_range) == 2
     query = {
@@ -87,103 +319,131 @@ def query_toggl_time_entries(
         "end_date": date_range[1],
         "order_by": "date",
     }
-    data = requests.post(
-        f"https://api.track.toggl.com/reports/api/v3/workspace/{workspace_id}/search/time_entries",
-        json=query,
-        headers={
-            "content-type": "application/json",
-            "Authorization": f'Basic {b64encode(bytes(api_token + ":api_token", encoding="utf-8")).decode("ascii"):s}',
-        },
-    )
-    return data.json()
+    # Entries for days that are over are settled, but today's are still being
+    # tracked, so only cache those briefly.
+    ttl = None if date_range[1] < date.today().isoformat() else 60
+    url = f"https://api.track.toggl.com/reports/api/v3/workspace/{workspace_id}/search/time_entries"
+
+    # The pages are cached together as one response, so that a run never joins
+    # freshly fetched pages to stale ones whose rows have since shifted.
+    path = _cache_path(session, "POST", url, ttl, query)
+    cached = _read_cached_response(path, ttl)
+    if cached is not None:
+        yield from cached
+        return
+
+    all_time_entries = []
+    page_query = query
+    while True:
+        time_entries, next_row = _fetch(session, "POST", url, page_query)
+        yield from time_entries
+        if cache_mode != "off":
+            all_time_entries.extend(time_entries)
+        if not next_row:
+            break
+        page_query = {**query, "first_row_number": int(next_row)}
+    _write_cached_response(path, all_time_entries)
 
 
 def query_toggl_clients(
-    api_token: str,
+    session: TogglSession,
     workspace_id: int,
 ):
     """
     Get a list of active clients from Toggl.
 
     args:
-    api_token -- Toggl API Token
+    session -- Toggl API session (a TogglSession)
     workspace_id -- your workspace ID (from query_toggl_workspaces())
 
     returns:
-    a list of clients
+    dict of lowercased client names to client IDs
     """
-    data = requests.get(
+    data = _toggl_request(
+        session,
+        "GET",
         f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/clients",
-        headers={
-            "content-type": "application/json",
-            "Authorization": f'Basic {b64encode(bytes(api_token + ":api_token", encoding="utf-8")).decode("ascii"):s}',
-        },
+        24 * 60 * 60,
     )
-    clients = {}
-    for client in data.json():
-        clients[client["name"].lower()] = client["id"]
-    return clients
+    return {client["name"].lower(): client["id"] for client in data}
+
+
+def _parse_timestamp(timestamp: str):
+    """
+    Parse a timestamp from the Toggl API, e.g. "2024-03-01T09:00:00+01:00".
+
+    args:
+    timestamp -- ISO 8601 timestamp with UTC offset
+
+    returns:
+    timezone-aware datetime
+    """
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        # fromisoformat() only accepts a "Z" UTC designator from Python 3.11
+        return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S%z")
 
 
-def generate_time_report(time_entries: json):
+def generate_time_report(time_entries: Iterable[dict]):
     """
     Prints an ASCII time report from the activities queried from Toggl.
 
     args:
-    time_entries -- The json returned from the Toggl API call (query_toggl_time_entries())
+    time_entries -- The results from the Toggl API call (query_toggl_time_entries())
     """
 
-    # Group entries by day
-    entries_by_day = {}
+    # Group entries by day, totalling time per task and per day as we go
+    entries_by_day = defaultdict(
+        lambda: {
+            "time_entries": [],
+            "task_totals": defaultdict(float),
+            "total_hours": 0.0,
+        }
+    )
     for entry in time_entries:
         # I think there is only ever one time entry per result here:
         assert len(entry["time_entries"]) == 1
         entry_detail = entry["time_entries"][0]
 
-        start_date = datetime.strptime(
-            entry_detail["start"], "%Y-%m-%dT%H:%M:%S%z"
-        ).date()
+        start = _parse_timestamp(entry_detail["start"])
+        stop = _parse_timestamp(entry_detail["stop"])
+        task = entry["description"]
+        task_hours = round(entry_detail["seconds"] / 3600, 1)
 
-        # Create a list for entries with this start date if it doesn't exist
-        # and populate it with all time entries
-        entries_by_day.setdefault(start_date, {"time_entries": []})
-        entries_by_day[start_date]["time_entries"].append(
+        entries = entries_by_day[start.date()]
+        entries["time_entries"].append(
             {
-                "task": entry["description"],
-                "task_hours": round(entry_detail["seconds"] / 3600, 1),
-                "start_time": datetime.strptime(
-                    entry_detail["start"], "%Y-%m-%dT%H:%M:%S%z"
-                ).time(),
-                "stop_time": datetime.strptime(
-                    entry_detail["stop"], "%Y-%m-%dT%H:%M:%S%z"
-                ).time(),
+                "task": task,
+                "task_hours": task_hours,
+                "start_time": start.time(),
+                "stop_time": stop.time(),
             }
         )
+        entries["task_totals"][task] += task_hours
+        entries["total_hours"] += task_hours
 
-    # Group entries by task and get total time per task and total per day
+    # Collect each day's report and write it out in one go
     for day, entries in entries_by_day.items():
-        entries["task_totals"] = {}
-        entries["total_hours"] = 0
+        lines = [
+            "----",
+            f"{_WEEKDAYS[day.weekday()]} {_MONTHS[day.month - 1]} {day.day:02d} {day.year}",
+            f'Total Time: {entries["total_hours"]:3.1f}',
+            "Task Summary:",
+        ]
+        for task, task_hours in entries["task_totals"].items():
+            lines.append(f"- {task}: {task_hours:3.1f}hrs")
+        lines.append("\r\nTime Entries:")
         for entry in entries["time_entries"]:
-            entries["task_totals"].setdefault(entry["task"], 0)
-            entries["task_totals"][entry["task"]] += entry["task_hours"]
-            entries["total_hours"] += entry["task_hours"]
-
-    for day, entries in entries_by_day.items():
-        print("----")
-        print(f'{day.strftime("%A %b %d %Y")}')
-        print(f'Total Time: {entries["total_hours"]:3.1f}')
-        print("Task Summary:")
-        for task in entries["task_totals"]:
-            print(f'- {task}: {entries["task_totals"][task]:3.1f}hrs')
-        print("\r\nTime Entries:")
-        for entry in entries["time_entries"]:
-            print(
+            start_time = entry["start_time"]
+            stop_time = entry["stop_time"]
+            lines.append(
                 f'{entry["task"]}, \
-{entry["start_time"].strftime("%H:%M")}->{entry["stop_time"].strftime("%H:%M")}, \
+{start_time.hour:02d}:{start_time.minute:02d}->{stop_time.hour:02d}:{stop_time.minute:02d}, \
 {entry["task_hours"]:3.1f}hrs'
             )
-        print("\r\n\n")
+        lines.append("\r\n\n")
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 def _enter_user_config():
@@ -192,14 +452,13 @@ def _enter_user_config():
     """
     done = False
     while not done:
-        config = configparser.ConfigParser()
-        config["SECRETS"] = {}
-        secret_cfg = config["SECRETS"]
+        secret_cfg = {}
+        config = {"SECRETS": secret_cfg}
         print("\r\nEnter Toggl API Token:")
         api_token = input()
         secret_cfg["api_token"] = api_token
         print("Querying workspace ID... ")
-        workspace_id = query_toggl_workspaces(api_token)
+        workspace_id = query_toggl_workspaces(TogglSession(api_token))
         print(f"Got workspace ID: {workspace_id}")
         secret_cfg["workspace_id"] = str(workspace_id)
         print("Entered config:")
@@ -209,19 +468,66 @@ def _enter_user_config():
     return config
 
 
-def _print_config(config):
+def _read_config(path: str):
     """
-    Prints a user config.
+    Reads a user config from a simple INI file.
 
     args:
-    config -- the user config to print
+    path -- path of the INI file
+
+    returns:
+    dict of sections, each a dict of setting names to values
+    """
+    config = {}
+    section = None
+    with open(path, encoding="utf-8") as configfile:
+        for line_number, line in enumerate(configfile, start=1):
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line[0] == "[" and line[-1] == "]":
+                section = config.setdefault(line[1:-1], {})
+                continue
+            # Like configparser, accept both "name = value" and "name: value",
+            # splitting on whichever delimiter comes first. Don't echo the line
+            # in errors, it may hold the API token.
+            delimiters = [i for i in (line.find("="), line.find(":")) if i != -1]
+            if not delimiters:
+                raise ValueError(
+                    f"{path}, line {line_number}: expected 'name = value' or 'name: value'"
+                )
+            if section is None:
+                raise ValueError(
+                    f"{path}, line {line_number}: setting outside of a [section]"
+                )
+            split = min(delimiters)
+            section[line[:split].strip().lower()] = line[split + 1 :].strip()
+    return config
+
+
+def _format_config(config):
+    """
+    Formats a user config as INI file contents.
+
+    args:
+    config -- the user config to format
     """
     config_str = ""
-    for section in config.sections():
+    for section, settings in config.items():
         config_str += f"[{section}]\n"
-        for name, value in config[section].items():
+        for name, value in settings.items():
             config_str += f"{name} = {value}\n"
-    print(config_str)
+    return config_str
+
+
+def _print_config(config):
+    """
+    Prints a user config.
+
+    args:
+    config -- the user config to print
+    """
+    print(_format_config(config))
 
 
 def _print_clients(clients):
@@ -246,29 +552,45 @@ if __name__ == "__main__":
         type=int,
         default=14,
     )
+    parser.add_argument(
+        "--no-cache",
+        help="Don't read or write the Toggl response cache.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--refresh",
+        help="Ignore cached Toggl responses and re-fetch them.",
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.no_cache:
+        cache_mode = "off"
+    elif args.refresh:
+        cache_mode = "refresh"
 
-    config = configparser.ConfigParser()
     CONFIG_PATH = "secrets.ini"
     if os.path.exists(CONFIG_PATH):
-        config.read(CONFIG_PATH)
+        config = _read_config(CONFIG_PATH)
     else:
         # No config file - prompt user for secrets
         print("No Config file found.")
         config = _enter_user_config()
         with open(CONFIG_PATH, "w", encoding="utf-8") as configfile:
-            config.write(configfile)
+            configfile.write(_format_config(config))
     secrets = config["SECRETS"]
 
     api_token = secrets["api_token"]
     workspace_id = int(secrets["workspace_id"])
-    clients = query_toggl_clients(api_token, workspace_id)
+    session = TogglSession(api_token)
 
+    # The client list is only needed to list or filter on clients, so skip the
+    # round trip for unfiltered reports.
     if args.list_clients:
-        _print_clients(clients)
+        _print_clients(query_toggl_clients(session, workspace_id))
         sys.exit(0)
 
     if args.client:
+        clients = query_toggl_clients(session, workspace_id)
         client_name = args.client.lower()
         if client_name in clients:
             print(f"Filtering on client: {args.client}")
@@ -281,7 +603,7 @@ if __name__ == "__main__":
         client_ids = []  # blank returns all clients
 
     time_entries = query_toggl_time_entries(
-        api_token=api_token,
+        session=session,
         workspace_id=workspace_id,
         client_ids=client_ids,
         date_range=get_previous_date_range(